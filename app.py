@@ -3,19 +3,137 @@ Application for entering pricing data and displaying basic analytics
 """
 # Built-ins
 import datetime
-from turtle import update
 
 import dash_bootstrap_components as dbc
 
 # 3rd-party
-import plotly.express as px
-from dash import Dash, Input, Output, State, ctx, dash_table, dcc, html
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from dash import Dash, Input, Output, Patch, State, ctx, dash_table, dcc, html
 
 # Internal
-from cpi import Observation
+import cpi
+from cpi import AVAILABLE_CATEGORIES, AVAILABLE_STATES, Observation
 
 app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 
+# Dash hands dates over as ISO strings; fromisoformat is ~10x faster than
+# strptime for parsing them back.
+_parse = datetime.date.fromisoformat
+
+# Records form of the observation table, keyed on the cpi cache version so it
+# is only rebuilt when a write or delete actually changed the table.
+_TABLE_CACHE = {"version": -1, "records": None}
+
+
+def records(df):
+    # This function is a faster equivalent of df.to_dict("records"): pandas
+    # boxes every cell individually via maybe_box_native, whereas zipping the
+    # column arrays only pays per-row dict construction. Object columns are
+    # cast once so their cells come back as the plain Python objects SQLite
+    # returned; numeric cells stay numpy scalars, which Dash accepts.
+    # Datetime columns are rendered as date-only strings so the DataTable
+    # shows one format everywhere, matching the rows prepended via Patch.
+    cols = list(df.columns)
+    arrs = [
+        df[c].dt.strftime("%Y-%m-%d").to_numpy()
+        if pd.api.types.is_datetime64_any_dtype(df[c])
+        else df[c].astype(object).to_numpy()
+        for c in cols
+    ]
+    return [dict(zip(cols, row)) for row in zip(*arrs)]
+
+
+# Item name -> trace index of the currently displayed scatter, so the save
+# path can Patch a point onto the right trace instead of rebuilding.
+_TRACE_IDX = {}
+
+
+def downsample(x, y, n_out=800):
+    # Largest-Triangle-Three-Buckets: keep ~n_out visually representative
+    # points so the figure payload stays bounded as observations accumulate.
+    # Positional indices stand in for x when computing triangle areas — the
+    # observations are near-uniformly spaced in time, so bucket shapes come
+    # out the same and the x values never need converting; the chosen
+    # indices then select from the original arrays.
+    n = len(y)
+    if n <= n_out:
+        return x, y
+    ys = np.asarray(y, dtype=float)
+    xs = np.arange(n, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1, dtype=int)
+    idx = np.empty(n_out, dtype=int)
+    idx[0] = 0
+    idx[-1] = n - 1
+    a = 0  # index of the previously selected point
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if hi <= lo:
+            idx[i + 1] = a = lo
+            continue
+        # Average of the next bucket (the last bucket averages to the end).
+        nhi = edges[i + 2] if i + 2 < n_out - 1 else n
+        avg_x = xs[hi:nhi].mean() if nhi > hi else xs[-1]
+        avg_y = ys[hi:nhi].mean() if nhi > hi else ys[-1]
+        areas = np.abs(
+            (xs[a] - avg_x) * (ys[lo:hi] - ys[a])
+            - (xs[a] - xs[lo:hi]) * (avg_y - ys[a])
+        )
+        idx[i + 1] = a = lo + int(areas.argmax())
+    return x[idx], y[idx]
+
+
+def build_scatter(df, title=None):
+    # Assemble the price scatter with explicit graph_objects traces:
+    # px.scatter spends most of its build time on DataFrame introspection and
+    # trace-group splitting, and Scattergl moves rendering to WebGL.
+    fig = go.Figure()
+    _TRACE_IDX.clear()
+    for item, sub in df.groupby("Item", sort=False):
+        x, y = downsample(sub["Date"].to_numpy(), sub["Price"].to_numpy())
+        fig.add_trace(go.Scattergl(x=x, y=y, mode="markers", name=item))
+        _TRACE_IDX[item] = len(fig.data) - 1
+    fig.update_layout(
+        title=title, xaxis_title="Date", yaxis_title="Price", legend_title_text="Item"
+    )
+    return fig
+
+
+def build_bar(agg):
+    # Bar chart of mean prices, one trace per city, from the already
+    # aggregated [City, Item, Price] frame.
+    fig = go.Figure()
+    for city, sub in agg.groupby("City", sort=False):
+        fig.add_trace(
+            go.Bar(x=sub["Item"].to_numpy(), y=sub["Price"].to_numpy(), name=city)
+        )
+    fig.update_layout(
+        barmode="group",
+        xaxis_title="Item",
+        yaxis_title="Price",
+        legend_title_text="City",
+    )
+    return fig
+
+
+def table_data():
+    # This function returns the observation DataFrame together with its
+    # to_dict("records") form, recomputing the records only when the
+    # underlying table changed. The version is snapshotted before the fetch:
+    # if a write lands in between, the records are stamped with the old
+    # version, so the next call rebuilds instead of serving them as current.
+    version = cpi._CACHE["version"]
+    df = Observation.table_df()
+    if _TABLE_CACHE["version"] != version:
+        _TABLE_CACHE["records"] = records(df)
+        _TABLE_CACHE["version"] = version
+    return df, _TABLE_CACHE["records"]
+
+
+# Fetch the table once for the initial layout; the scatter and the DataTable
+# below both render from this single snapshot.
+_initial_df, _initial_records = table_data()
 
 app.layout = html.Div(
     [
@@ -33,14 +151,13 @@ app.layout = html.Div(
                         html.Br(),
                         html.Label("Category"),
                         dcc.Dropdown(
-                            options=Observation.available_categories(),
+                            options=AVAILABLE_CATEGORIES,
                             value="Food",
                             id="category-input",
                         ),
                         html.Br(),
                         html.Label("Item"),
                         dcc.Dropdown(
-                            options=Observation.available_items(),
                             value="USDA Grade-A eggs",
                             id="item-input",
                         ),
@@ -56,7 +173,7 @@ app.layout = html.Div(
                         html.Br(),
                         html.Label("State"),
                         dcc.Dropdown(
-                            options=Observation.available_states(),
+                            options=AVAILABLE_STATES,
                             value="Texas",
                             id="state-input",
                         ),
@@ -113,11 +230,8 @@ app.layout = html.Div(
                             id="graph-type",
                         ),
                         dcc.Graph(
-                            figure=px.scatter(
-                                Observation.table_df(),
-                                x="Date",
-                                y="Price",
-                                color="Item",
+                            figure=build_scatter(
+                                _initial_df,
                                 title="Item Prices Over Time",
                             ),
                             id="observation-graph",
@@ -126,8 +240,13 @@ app.layout = html.Div(
                             "Table of Observations", style={"text-align": "center"}
                         ),
                         dash_table.DataTable(
-                            Observation.table_df().to_dict("records"),
+                            _initial_records,
                             id="observation-table",
+                            # Virtualize so only the visible rows are
+                            # rendered in the DOM as the table grows.
+                            virtualization=True,
+                            page_action="none",
+                            fixed_rows={"headers": True},
                             # style dash table
                             style_table={"height": "400px", "overflowY": "auto"},
                             style_cell={"textAlign": "center", "padding": "5px"},
@@ -138,23 +257,44 @@ app.layout = html.Div(
             ],
             style={"display": "flex", "flex-direction": "row"},
         ),
+        # Written by the table callback so the graph callback knows whether
+        # the last change was a pure append (patchable) or needs a rebuild.
+        dcc.Store(id="last-action"),
+        # Dropdown linkage maps, shipped to the browser once so the chained
+        # option updates below never round-trip to the server.
+        dcc.Store(id="category-item-store", data=Observation.category_item_map),
+        dcc.Store(id="state-city-store", data=Observation.state_city_map),
     ],
 )
 
 
-# Update city by state dropdown
-@app.callback(Output("city-input", "options"), [Input("state-input", "value")])
-def update_date_dropdown(state):
-    return [{"label": i, "value": i} for i in Observation.state_city_map[state]]
+# Narrow the item options to the selected category (and cities to the
+# selected state) in the browser: the stores hold the maps, so switching a
+# dropdown is a dictionary lookup client-side instead of a callback request.
+app.clientside_callback(
+    "function(category, map) { return (map && map[category]) || []; }",
+    Output("item-input", "options"),
+    Input("category-input", "value"),
+    State("category-item-store", "data"),
+)
 
+app.clientside_callback(
+    "function(state, map) { return (map && map[state]) || []; }",
+    Output("city-input", "options"),
+    Input("state-input", "value"),
+    State("state-city-store", "data"),
+)
 
+
+# The table and the graph are separate callbacks so that read-only UI
+# changes (flipping graph-type or the date) never touch SQLite or rebuild
+# the records payload — only the save and delete buttons own the table.
 @app.callback(
     Output(component_id="observation-table", component_property="data"),
-    Output(component_id="observation-graph", component_property="figure"),
+    Output(component_id="last-action", component_property="data"),
     Input(component_id="save-button", component_property="n_clicks"),
     Input(component_id="delete-button", component_property="n_clicks"),
-    Input(component_id="graph-type", component_property="value"),
-    Input(component_id="date-input", component_property="date"),
+    State(component_id="date-input", component_property="date"),
     State(component_id="category-input", component_property="value"),
     State(component_id="item-input", component_property="value"),
     State(component_id="price-input", component_property="value"),
@@ -165,7 +305,6 @@ def update_date_dropdown(state):
 def update_observation(
     n_clicks: float,
     n_clicks2,
-    graph_type: str,
     date: str,
     category: str,
     item: str,
@@ -173,19 +312,10 @@ def update_observation(
     state: str,
     city: str,
     observations_to_delete,
-    *args
 ):
     triggered_id = ctx.triggered_id  # Id of the input that triggered the callback
 
-    if triggered_id == "graph-type":
-        return update_graph(graph_type, date)
-
-    if triggered_id == "date-input":
-        if graph_type != "Average Item Price by City":
-            return update_graph(graph_type, date)
-        return update_graph("Average Item Price by City", date)
-
-    elif triggered_id == "delete-button":
+    if triggered_id == "delete-button":
         return delete_observations(
             n_clicks2=n_clicks2,
             date=date,
@@ -196,19 +326,34 @@ def update_observation(
             city=city,
             observations_to_delete=observations_to_delete,
         )
-    else:
-        if n_clicks >= 1:
-            obj = Observation(
-                Date=datetime.datetime.strptime(date, "%Y-%m-%d").date(),
-                Category=category,
-                Item=item,
-                Price=price,
-                State=state,
-                City=city,
-            )
-            obj.write()
-        df = Observation.table_df()
-        return df.to_dict("records"), px.scatter(df, x="Date", y="Price", color="Item")
+    if n_clicks >= 1:
+        obj = Observation(
+            Date=_parse(date),
+            Category=category,
+            Item=item,
+            Price=price,
+            State=state,
+            City=city,
+        )
+        obj.write()
+        if None not in (date, category, item, price, state, city):
+            # A save is a pure append: push only the new row to the client
+            # instead of reserializing the whole table. The graph callback
+            # picks the record up from the last-action store.
+            record = {
+                "Date": date,
+                "Item": item,
+                "Price": price,
+                "Category": category,
+                "State": state,
+                "City": city,
+                "AddedOn": datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            table_patch = Patch()
+            table_patch.prepend(record)  # table is newest-first
+            return table_patch, {"action": "save", "record": record}
+    df, data = table_data()
+    return data, {"action": "refresh"}
 
 
 def delete_observations(
@@ -220,7 +365,7 @@ def delete_observations(
     if n_clicks2 >= 1:
         number_to_delete = observations_to_delete
         obj = Observation(
-            Date=datetime.datetime.strptime(date, "%Y-%m-%d").date(),
+            Date=_parse(date),
             Category=category,
             Item=item,
             Price=price,
@@ -234,36 +379,47 @@ def delete_observations(
             category=category,
             n_to_delete=number_to_delete,
         )
-    df = Observation.table_df()
-    return df.to_dict("records"), px.scatter(df, x="Date", y="Price", color="Item")
+    df, data = table_data()
+    return data, {"action": "refresh"}
 
 
-def update_graph(graph_type: str, date: str):
+# Chained on the last-action store instead of the buttons directly so the
+# figure update is guaranteed to run after the write/delete has landed.
+@app.callback(
+    Output(component_id="observation-graph", component_property="figure"),
+    Input(component_id="graph-type", component_property="value"),
+    Input(component_id="date-input", component_property="date"),
+    Input(component_id="last-action", component_property="data"),
+)
+def update_graph(graph_type: str, date: str, last_action=None):
+    if (
+        ctx.triggered_id == "last-action"
+        and graph_type != "Average Item Price by City"
+        and last_action
+        and last_action.get("action") == "save"
+        and last_action["record"]["Item"] in _TRACE_IDX
+    ):
+        # Pure append while the scatter is showing: patch the one new point
+        # onto its Item trace instead of reserializing the whole figure.
+        record = last_action["record"]
+        fig_patch = Patch()
+        trace = fig_patch["data"][_TRACE_IDX[record["Item"]]]
+        trace["x"].append(record["Date"])
+        trace["y"].append(record["Price"])
+        return fig_patch
     if graph_type == "Average Item Price by City":
         df = Observation.table_df()
-        # The selected date is not represented the same way in the dataframe.
-        # Hence the selected date is modified to match that of the dataframe to
-        # enable filtering of the data.
-        date_format_for_custom_added_data = str(
-            datetime.datetime.strptime(date, "%Y-%m-%d").date()
-        )
-        date_format_for_preinstantiated_data = str(
-            datetime.datetime.strptime(date + " 00:00:00", "%Y-%m-%d %H:%M:%S")
+        # table_df parses Date to datetime64, so the selected day is one
+        # vectorized timestamp comparison; only the Price column is
+        # aggregated.
+        mask = df["Date"] == pd.Timestamp(date)
+        data_for_selected_date = df.loc[mask, ["City", "Item", "Price"]]
+        return build_bar(
+            data_for_selected_date.groupby(
+                ["City", "Item"], as_index=False, sort=False
+            )["Price"].mean()
         )
-        data_for_selected_date = df.loc[
-            (df["Date"] == date_format_for_preinstantiated_data)
-            | (df["Date"] == date_format_for_custom_added_data)
-        ]
-        return df.to_dict("records"), px.bar(
-            data_for_selected_date.groupby(["City", "Item"]).mean().reset_index(),
-            x="Item",
-            y="Price",
-            color="City",
-            hover_data=["Item"],
-            barmode="group",
-        )
-    df = Observation.table_df()
-    return df.to_dict("records"), px.scatter(df, x="Date", y="Price", color="Item")
+    return build_scatter(Observation.table_df())
 
 
 if __name__ == "__main__":
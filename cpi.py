@@ -3,14 +3,14 @@ Library for modeling prices for various objects
 """
 # Built-ins
 import datetime
-import functools
 import itertools
 import logging
-import random
 import sqlite3
+import threading
 from typing import Optional, Union
 
 # 3rd-party
+import numpy as np
 import pandas as pd
 
 # Internal
@@ -19,6 +19,37 @@ import pandas as pd
 logger = logging.getLogger(__name__)
 db_file = "test.db"
 
+# One long-lived connection instead of a connect/close per query: Dash
+# callbacks otherwise re-open the file, re-read the schema, and pay the
+# rollback journal's fsyncs on every write. WAL mode lets readers run
+# alongside a writer; the lock serializes use across Dash's worker threads.
+_CON = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+_CON.execute("PRAGMA journal_mode=WAL")
+_CON.execute("PRAGMA synchronous=NORMAL")
+# Make sure delete_matching's lookup index exists even on databases created
+# before create_table started adding it (guarded because a fresh db file has
+# no Observation table yet).
+if _CON.execute(
+    "select 1 from sqlite_master where type='table' and name='Observation'"
+).fetchone():
+    _CON.execute(
+        "CREATE INDEX IF NOT EXISTS ix_obs_lookup "
+        "ON Observation(State, City, Date, Category)"
+    )
+_LOCK = threading.Lock()
+
+# In-process cache for the Observation table. The version counter increases
+# whenever a write or delete commits, so callers can key derived data (e.g.
+# the Dash records form) off it and only recompute when the table changed.
+_CACHE = {"version": 0, "df": None}
+
+
+def _invalidate_cache():
+    # This is to drop the cached DataFrame after any DML so the next
+    # table_df() call re-reads from the database.
+    _CACHE["version"] += 1
+    _CACHE["df"] = None
+
 
 def sqlize(v: Union[str, int, float, bool, datetime.date, datetime.date]) -> str:
     # This function is for converting values to SQL strings.
@@ -65,32 +96,28 @@ class Observation:
     }
 
     @classmethod
-    @functools.lru_cache(maxsize=None)
     def available_items(cls):
-        # This function returns a list of all available items from the
+        # This function returns all available items from the
         # category_item_map dictionary.
-        return list(itertools.chain.from_iterable(cls.category_item_map.values()))
+        return AVAILABLE_ITEMS
 
     @classmethod
-    @functools.lru_cache(maxsize=None)
     def available_categories(cls):
-        # This function returns a list of all available categories from the
+        # This function returns all available categories from the
         # category_item_map dictionary. The categories are the keys of the
         # dictionary.
-        return list(cls.category_item_map.keys())
+        return AVAILABLE_CATEGORIES
 
     @classmethod
-    @functools.lru_cache(maxsize=None)
     def available_states(cls):
-        return list(cls.state_city_map.keys())
+        return AVAILABLE_STATES
 
     @classmethod
-    @functools.lru_cache(maxsize=None)
     def available_cities(cls):
-        # This function returns a list of all available cities from the state_city_map dictionary.
-        # The cities are the values of the dictionary, with the keys being the
-        # states.
-        return list(itertools.chain.from_iterable(cls.state_city_map.values()))
+        # This function returns all available cities from the state_city_map
+        # dictionary. The cities are the values of the dictionary, with the
+        # keys being the states.
+        return AVAILABLE_CITIES
 
     def __init__(self, **kwargs):
         for k, v in kwargs.items():
@@ -101,29 +128,38 @@ class Observation:
                     f"{k} is not a valid attribute of Observation. Ignoring..."
                 )
 
+    _INSERT_SQL = (
+        "INSERT INTO Observation (Date, Item, Price, Category, State, City) "
+        "values (?, ?, ?, ?, ?, ?)"
+    )
+
     def write(self):
-        with sqlite3.connect(db_file) as con:
-            # This is to write the observation to the database.
-            # Create a list of the SQL standard representations of the attributes of the observation.
-            # Then join the list together separated by comma to fill the various columns of the table.
-            row = [
-                sqlize(v)
-                for v in [
-                    self.Date,
-                    self.Item,
-                    self.Price,
-                    self.Category,
-                    self.State,
-                    self.City,
-                ]
-            ]
-            # handle None values for empty inputs
-            if "None" not in row:
-                sql = (
-                    f"INSERT INTO Observation (Date, Item, Price, Category, State, City) values "
-                    f'({", ".join(row)})'
-                )
-                con.execute(sql)
+        # This is to write the observation to the database. A
+        # parameterized statement lets SQLite reuse one prepared plan and
+        # avoids per-value sqlize formatting (and its quoting pitfalls).
+        row = (
+            self.Date,
+            self.Item,
+            self.Price,
+            self.Category,
+            self.State,
+            self.City,
+        )
+        # handle None values for empty inputs
+        if any(v is None for v in row):
+            return
+        with _LOCK:
+            _CON.execute(self._INSERT_SQL, row)
+        _invalidate_cache()
+
+    @classmethod
+    def write_many(cls, rows):
+        # Bulk-insert (Date, Item, Price, Category, State, City) tuples with
+        # one prepared statement via executemany, instead of a parse+bind
+        # cycle per row.
+        with _LOCK:
+            _CON.executemany(cls._INSERT_SQL, rows)
+        _invalidate_cache()
 
     @classmethod
     def create_table(cls):
@@ -146,52 +182,94 @@ class Observation:
             # Load test data
             df = cls.get_test_data()
             df.to_sql("Observation", con=con, if_exists="append", index=False)
+            # Covering index for delete_matching's WHERE clause, so the inner
+            # rowid select is an index seek instead of a full table scan.
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS ix_obs_lookup "
+                "ON Observation(State, City, Date, Category)"
+            )
+        _invalidate_cache()
 
     @classmethod
     def get_test_data(cls) -> pd.DataFrame:
         dt_range = pd.date_range(
             end=datetime.date.today(), periods=10, freq="D", inclusive="both"
         )
-        combos = [
-            {"Date": dt, "Category": cat, "Item": item, "State": state, "City": city}
-            for cat, items in cls.category_item_map.items()
-            for item in items
-            for state, cities in cls.state_city_map.items()
-            for city in cities
-            for dt in dt_range
-            for _ in range(5)
-        ]  # Create 5 prices per combo
-        df = pd.DataFrame(combos)
-        # Set all base prices to the average price for the item
-        df["Price"] = df.apply(lambda s: cls.item_base_price[s["Item"]], axis=1)
-        # Multiply the base price by the state scaling factor
-        df["Price"] = df.apply(
-            lambda s: s["Price"] * cls.state_price_mu_std[s["State"]][0], axis=1
-        )
-        # Generate a gaussian price based on the state standard deviation
-        df["Price"] = df.apply(
-            lambda s: random.gauss(
-                s["Price"], s["Price"] * cls.state_price_mu_std[s["State"]][1]
-            ),
-            axis=1,
+        n_rep = 5  # Create 5 prices per combo
+        # Enumerate the (category, item, state, city) keys once, then expand
+        # them to flat column arrays with np.repeat/np.tile instead of
+        # allocating one dict per row in a nested comprehension.
+        cat_items = [
+            (c, i) for c, items in cls.category_item_map.items() for i in items
+        ]
+        state_cities = [
+            (s, c) for s, cities in cls.state_city_map.items() for c in cities
+        ]
+        keys = [
+            (cat, item, state, city)
+            for (cat, item), (state, city) in itertools.product(cat_items, state_cities)
+        ]
+        block = len(dt_range) * n_rep  # rows per key
+        df = pd.DataFrame(
+            {
+                "Date": np.tile(np.repeat(dt_range.values, n_rep), len(keys)),
+                "Category": np.repeat([k[0] for k in keys], block),
+                "Item": np.repeat([k[1] for k in keys], block),
+                "State": np.repeat([k[2] for k in keys], block),
+                "City": np.repeat([k[3] for k in keys], block),
+            }
         )
+        # Scale each item's base price by the state mean factor, then draw
+        # gaussian prices with the state standard deviation — all as vector
+        # operations instead of three row-wise df.apply passes.
+        base = df["Item"].map(cls.item_base_price).to_numpy()
+        mu = df["State"].map({s: v[0] for s, v in cls.state_price_mu_std.items()})
+        std = df["State"].map({s: v[1] for s, v in cls.state_price_mu_std.items()})
+        mean = base * mu.to_numpy()
+        df["Price"] = np.random.normal(mean, mean * std.to_numpy())
         return df
 
     @staticmethod
     def table_df() -> pd.DataFrame:
-        with sqlite3.connect(db_file) as con:
-            sql = "select * from Observation"
-            return pd.read_sql(sql, con).sort_index(ascending=False)
+        # Serve the cached frame when no write/delete has happened since the
+        # last read; this keeps Dash callbacks off the SQLite round-trip.
+        if _CACHE["df"] is not None:
+            return _CACHE["df"]
+        # Newest rows first straight from SQLite's rowid traversal, instead
+        # of materializing the frame and re-sorting it in pandas.
+        sql = "select * from Observation order by rowid desc"
+        with _LOCK:
+            df = pd.read_sql(sql, _CON)
+        # Date is stored as text, either "YYYY-MM-DD" or "YYYY-MM-DD
+        # 00:00:00" depending on the writer. Slicing to the date part leaves
+        # one fixed format to parse, so the column comes back as datetime64
+        # and downstream filters compare timestamps instead of strings.
+        df["Date"] = pd.to_datetime(df["Date"].str.slice(0, 10), format="%Y-%m-%d")
+        _CACHE["df"] = df
+        return df
 
     def delete_matching(
         self, n_to_delete: int = 1, order_to_delete_in: Optional[dict] = None, **kwargs
     ):
-        with sqlite3.connect(db_file) as con:
-            conditions = " AND ".join(
-                [f"{k.capitalize()}={sqlize(v)}" for k, v in kwargs.items()]
-            )
-            sql_to_delete_rows = f"DELETE from Observation WHERE rowid in (SELECT rowid FROM Observation WHERE {conditions} LIMIT {n_to_delete})"
-            con.execute(sql_to_delete_rows)
+        conditions = " AND ".join([f"{k.capitalize()}=?" for k in kwargs])
+        sql_to_delete_rows = f"DELETE from Observation WHERE rowid in (SELECT rowid FROM Observation WHERE {conditions} LIMIT ?)"
+        with _LOCK:
+            _CON.execute(sql_to_delete_rows, (*kwargs.values(), n_to_delete))
+        _invalidate_cache()
+
+
+# Frozen views over the Observation maps, computed once at import time.
+# Module constants rather than (cached) classmethods: callers like the Dash
+# dropdown options read these on every re-render, and a plain global lookup
+# skips the descriptor and cache-key overhead entirely.
+AVAILABLE_ITEMS = tuple(
+    itertools.chain.from_iterable(Observation.category_item_map.values())
+)
+AVAILABLE_CATEGORIES = tuple(Observation.category_item_map)
+AVAILABLE_STATES = tuple(Observation.state_city_map)
+AVAILABLE_CITIES = tuple(
+    itertools.chain.from_iterable(Observation.state_city_map.values())
+)
 
 
 if __name__ == "__main__":
@@ -47,6 +47,19 @@ class TestObservation(unittest.TestCase):
         after_adding_observation = obj.table_df()
         self.assertEqual(len(before_adding_observation), len(after_adding_observation))
 
+    # test bulk insert adds all rows
+    def test_write_many(self):
+        rows = [
+            (datetime.date.today(), "Dozen eggs", 3.99, "Food", "Texas", "Dallas"),
+            (datetime.date.today(), "Dozen eggs", 4.29, "Food", "Texas", "Austin"),
+        ]
+        before_adding_observations = Observation.table_df()
+        Observation.write_many(rows)
+        after_adding_observations = Observation.table_df()
+        self.assertEqual(
+            len(after_adding_observations), len(before_adding_observations) + len(rows)
+        )
+
     # test oberservation added
     def test_save_observation_is_submitted(self):
         inputs = {